@@ -1,17 +1,29 @@
 """Client Module."""
+import os
 import uuid
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Iterable
 
 import requests
 from requests.adapters import HTTPAdapter, Retry
 from requests.models import Response
 
+from .phone import UNDELIVERABLE_ERROR_CODE, WaIdCache, normalize_phone_number
+
+MEDIA_CHUNK_SIZE = 64 * 1024
+MEDIA_MAX_WORKERS = 4
+
 
 class Client:
     """A client to connect WhatsApp Business Cloud API."""
 
     def __init__(
-        self, token: str, phone_number_id: int, api_version: str = "v15.0"
+        self,
+        token: str,
+        phone_number_id: int,
+        api_version: str = "v15.0",
+        wa_id_cache: WaIdCache | None = None,
     ) -> None:
         """Initialize Client objetc.
 
@@ -21,10 +33,18 @@ class Client:
             token (str): WhatsApp Business Cloud API Token given by Meta.
             phone_number_id (str): Phone number id given by Meta.
             api_version (str, optional): Meta api version. Defaults to "v15.0".
+            wa_id_cache (WaIdCache, optional): Cache of WhatsApp IDs. When
+                given, phone numbers are normalized before sending, known
+                invalid ones are rejected without a request, and the wa_id
+                returned by Meta is stored. Failed statuses received in
+                webhooks must be recorded with WaIdCache.record_status.
+                Defaults to None.
         """
         self.token: str = token
         self.phone_number_id: int = phone_number_id
-        self.url: str = f"https://graph.facebook.com/{api_version}/{phone_number_id}/messages?access_token={token}"
+        self.graph_url: str = f"https://graph.facebook.com/{api_version}"
+        self.url: str = f"{self.graph_url}/{phone_number_id}/messages?access_token={token}"
+        self.wa_id_cache: WaIdCache | None = wa_id_cache
         self.headers: dict = {"Content-Type": "application/json"}
         self.message: dict = {
             "messaging_product": "whatsapp",
@@ -32,17 +52,65 @@ class Client:
 
     def _config_and_post(self, _type: str, _to: str) -> Response:
         # sourcery skip: class-extract-method
-        self.message["type"] = _type
-        self.message["to"] = _to
-        return self._post()
+        if self.wa_id_cache is None:
+            self.message["type"] = _type
+            self.message["to"] = _to
+            return self._post()
+
+        phone_number = normalize_phone_number(_to)
+        if phone_number is None:
+            raise ValueError(f"Invalid phone number: {_to}")
+        invalid, recipient = self.wa_id_cache.resolve(phone_number)
+        if invalid:
+            raise ValueError(f"Phone number known to be invalid: {_to}")
 
-    def _post(self) -> Response:
+        self.message["type"] = _type
+        self.message["to"] = recipient
+        response = self._post()
+        self._cache_wa_id(phone_number, response)
+        return response
+
+    def _cache_wa_id(self, phone_number: str, response: Response) -> None:
+        # Only synchronous send errors are handled here. Undeliverable messages
+        # are usually reported later as failed statuses in webhooks, see
+        # WaIdCache.record_status.
+        if self.wa_id_cache is None:
+            return
+        try:
+            content = response.json()
+        except ValueError:
+            return
+        if not isinstance(content, dict):
+            return
+
+        contacts = content.get("contacts")
+        error = content.get("error")
+        if (
+            isinstance(contacts, list)
+            and contacts
+            and isinstance(contacts[0], dict)
+            and "wa_id" in contacts[0]
+        ):
+            self.wa_id_cache.set_wa_id(phone_number, contacts[0]["wa_id"])
+        elif isinstance(error, dict) and error.get("code") == UNDELIVERABLE_ERROR_CODE:
+            self.wa_id_cache.mark_invalid(phone_number)
+
+    def _session(self) -> requests.Session:
         request_session = requests.Session()
         retries = Retry(
             total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]
         )
         request_session.mount("", HTTPAdapter(max_retries=retries))
-        return request_session.post(self.url, headers=self.headers, json=self.message)
+        return request_session
+
+    def _post(self) -> Response:
+        return self._session().post(self.url, headers=self.headers, json=self.message)
+
+    def _get(
+        self, session: requests.Session, url: str, stream: bool = False
+    ) -> Response:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        return session.get(url, headers=headers, stream=stream)
 
     def mark_as_read(self, message_id: str) -> Response:
         """Mark messages as read.
@@ -260,3 +328,137 @@ class Client:
 
         self.message[media_type] = media
         return self._config_and_post(media_type, phone_number)
+
+    def media_url(self, media_id: str) -> Response:
+        """Retrieve the url of an inbound media.
+
+        https://developers.facebook.com/docs/whatsapp/cloud-api/reference/media#retrieve-media-url
+
+        Args:
+            media_id (str): Media id received in the webhook notification.
+
+        Returns:
+            requests.models.Response: Object which contains a server's response
+                to an HTTP request. Its json content has the keys url,
+                mime_type, sha256, file_size and id.
+        """
+        with self._session() as session:
+            return self._get(session, f"{self.graph_url}/{media_id}")
+
+    def download_media(
+        self,
+        media_id: str,
+        destination: str | os.PathLike | IO[bytes],
+        chunk_size: int = MEDIA_CHUNK_SIZE,
+    ) -> int:
+        """Download an inbound media, streaming it in chunks.
+
+        The media is never fully loaded into memory, it is written to the
+        destination chunk by chunk. When the destination is a path, the media
+        is written to a temporary file which replaces it once complete, so a
+        failed download never leaves a truncated file behind.
+
+        Args:
+            media_id (str): Media id received in the webhook notification.
+            destination (str | os.PathLike | IO[bytes]): Path of the file to
+                write, or a binary file-like object opened for writing.
+            chunk_size (int, optional): Size in bytes of every chunk.
+                Defaults to MEDIA_CHUNK_SIZE.
+
+        Raises:
+            requests.HTTPError: If the media url or the media itself could
+                not be retrieved.
+            ValueError: If the media url response has no url.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        with self._session() as session:
+            response = self._get(session, f"{self.graph_url}/{media_id}")
+            response.raise_for_status()
+            content = response.json()
+            if not isinstance(content, dict) or "url" not in content:
+                raise ValueError(f"No url for media {media_id}: {content!r}")
+
+            with self._get(session, content["url"], stream=True) as media:
+                media.raise_for_status()
+                if isinstance(destination, (str, os.PathLike)):
+                    return self._write_file(media, Path(destination), chunk_size)
+                return self._write_chunks(media, destination, chunk_size)
+
+    def _write_file(self, media: Response, path: Path, chunk_size: int) -> int:
+        partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with open(partial, "wb") as file:
+                written = self._write_chunks(media, file, chunk_size)
+            os.replace(partial, path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        return written
+
+    @staticmethod
+    def _write_chunks(media: Response, file: IO[bytes], chunk_size: int) -> int:
+        written = 0
+        for chunk in media.iter_content(chunk_size=chunk_size):
+            file.write(chunk)
+            written += len(chunk)
+        return written
+
+    def _download_cached_media(
+        self, media_id: str, directory: Path, chunk_size: int
+    ) -> Path:
+        path = directory / media_id
+        if not path.exists():
+            self.download_media(media_id, path, chunk_size)
+        return path
+
+    def download_medias(
+        self,
+        media_ids: Iterable[str],
+        directory: str | os.PathLike,
+        max_workers: int = MEDIA_MAX_WORKERS,
+        chunk_size: int = MEDIA_CHUNK_SIZE,
+    ) -> dict[str, Path]:
+        """Download several inbound medias in parallel into a cache directory.
+
+        Every media is stored as a file named after its media id, so repeated
+        ids are downloaded only once and medias already present in the
+        directory are not downloaded again.
+
+        Args:
+            media_ids (Iterable[str]): Media ids received in the webhook
+                notifications.
+            directory (str | os.PathLike): Cache directory for the medias. It
+                is created if it does not exist.
+            max_workers (int, optional): Maximum number of parallel downloads.
+                Defaults to MEDIA_MAX_WORKERS.
+            chunk_size (int, optional): Size in bytes of every chunk.
+                Defaults to MEDIA_CHUNK_SIZE.
+
+        Raises:
+            ValueError: If a media id is not a valid file name, e.g. empty or
+                containing path separators, or a media url response has no
+                url.
+            requests.HTTPError: If any media could not be retrieved.
+
+        Returns:
+            dict[str, Path]: Path of the downloaded file for every media id.
+        """
+        unique_ids = list(dict.fromkeys(media_ids))
+        for media_id in unique_ids:
+            # Media ids are used as file names inside the cache directory.
+            if not (media_id.isascii() and media_id.isalnum()):
+                raise ValueError(f"Invalid media id: {media_id!r}")
+
+        cache = Path(directory)
+        cache.mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            paths = executor.map(
+                lambda media_id: self._download_cached_media(
+                    media_id, cache, chunk_size
+                ),
+                unique_ids,
+            )
+            return dict(zip(unique_ids, paths))
@@ -0,0 +1,322 @@
+"""Phone Module."""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Iterable
+
+E164_MIN_DIGITS = 8
+E164_MAX_DIGITS = 15
+WA_ID_CACHE_MAX_SIZE = 100_000
+WA_ID_CACHE_TTL = 7 * 24 * 60 * 60
+# Error code for recipients which can not receive WhatsApp messages.
+UNDELIVERABLE_ERROR_CODE = 131026
+# Unicode categories of space, dash and bracket characters.
+_SEPARATOR_CATEGORIES = {"Zs", "Pd", "Ps", "Pe"}
+
+
+class _SeparatorTable(dict):
+    """str.translate table removing Unicode whitespace, dashes, dots and brackets.
+
+    Entries are computed on first use, so every character is classified only
+    once however many numbers are normalized.
+    """
+
+    def __missing__(self, key: int) -> int | None:
+        char = chr(key)
+        separator = (
+            char.isspace()
+            or char == "."
+            or unicodedata.category(char) in _SEPARATOR_CATEGORIES
+        )
+        value = None if separator else key
+        self[key] = value
+        return value
+
+
+_SEPARATORS = _SeparatorTable()
+
+
+def normalize_phone_number(
+    phone_number: str,
+    default_country_code: str | None = None,
+    national_number_length: int | None = None,
+) -> str | None:
+    """Normalize a phone number to the WhatsApp ID (E.164 without "+") form.
+
+    Whitespace, dashes, dots and brackets (including their Unicode variants)
+    are removed, as well as the "+" or "00" international prefix. Numbers
+    with letters or any other character, e.g. "#", "*" or ",", are invalid.
+
+    Numbers starting with "+" or "00" are international. Without
+    default_country_code, any other number must already include its country
+    code. With it, trunk zeros are removed and then:
+
+    - without national_number_length, the country code is prepended unless
+      the number already starts with it, in which case it is ambiguous and
+      invalid.
+    - with national_number_length, the country code is prepended to numbers
+      of that length, numbers of the full international length starting
+      with the country code are kept, and any other number is invalid.
+
+    Ambiguous numbers are taken as invalid rather than guessed, so that
+    messages are never sent to the wrong person.
+
+    Args:
+        phone_number (str): Raw phone number, e.g. "+56 9 9999-9999".
+        default_country_code (str, optional): Country code for national
+            numbers. Defaults to None.
+        national_number_length (int, optional): Number of digits of national
+            numbers, without trunk zeros, of default_country_code.
+            Defaults to None.
+
+    Returns:
+        str | None: Normalized phone number, or None if it is not a valid
+            E.164 number.
+    """
+    number = phone_number.translate(_SEPARATORS)
+    if number.startswith("+"):
+        number = number[1:]
+    elif number.startswith("00"):
+        number = number[2:]
+    elif default_country_code is not None:
+        number = number.lstrip("0")
+        has_country_code = number.startswith(default_country_code)
+        if national_number_length is None:
+            if has_country_code:
+                return None
+            number = default_country_code + number
+        elif len(number) == national_number_length:
+            number = default_country_code + number
+        elif not (
+            has_country_code
+            and len(number) == len(default_country_code) + national_number_length
+        ):
+            return None
+
+    if not (number.isascii() and number.isdigit()) or number.startswith("0"):
+        return None
+    if not E164_MIN_DIGITS <= len(number) <= E164_MAX_DIGITS:
+        return None
+    return number
+
+
+def normalize_phone_numbers(
+    phone_numbers: Iterable[str],
+    default_country_code: str | None = None,
+    national_number_length: int | None = None,
+) -> dict[str, str | None]:
+    """Normalize a list of phone numbers.
+
+    Every distinct input is normalized only once, so large recipient lists
+    with repeated numbers are cheap to process.
+
+    Args:
+        phone_numbers (Iterable[str]): Raw phone numbers.
+        default_country_code (str, optional): See normalize_phone_number.
+            Defaults to None.
+        national_number_length (int, optional): See normalize_phone_number.
+            Defaults to None.
+
+    Returns:
+        dict[str, str | None]: Normalized phone number (or None if invalid)
+            for every input phone number, in input order.
+    """
+    return {
+        phone_number: normalize_phone_number(
+            phone_number, default_country_code, national_number_length
+        )
+        for phone_number in dict.fromkeys(phone_numbers)
+    }
+
+
+class WaIdCache:
+    """A thread safe LRU cache with expiration for WhatsApp IDs.
+
+    Maps normalized phone numbers to the WhatsApp ID returned by Meta, or to
+    an invalid marker for numbers known not to be reachable on WhatsApp.
+    """
+
+    def __init__(
+        self, max_size: int = WA_ID_CACHE_MAX_SIZE, ttl: float = WA_ID_CACHE_TTL
+    ) -> None:
+        """Initialize WaIdCache object.
+
+        Args:
+            max_size (int, optional): Maximum number of entries. The least
+                recently used entry is evicted when it is exceeded.
+                Defaults to WA_ID_CACHE_MAX_SIZE.
+            ttl (float, optional): Seconds an entry is valid for.
+                Defaults to WA_ID_CACHE_TTL (one week).
+        """
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self._entries: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of entries, including expired ones."""
+        return len(self._entries)
+
+    def _set(self, phone_number: str, wa_id: str | None) -> None:
+        with self._lock:
+            self._entries[phone_number] = (wa_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(phone_number)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def lookup(self, phone_number: str) -> tuple[bool, str | None]:
+        """Look up a phone number.
+
+        Args:
+            phone_number (str): Normalized phone number.
+
+        Returns:
+            tuple[bool, str | None]: Whether the phone number is cached, and
+                its WhatsApp ID, which is None if it was marked as invalid.
+        """
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None:
+                return False, None
+            wa_id, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[phone_number]
+                return False, None
+            self._entries.move_to_end(phone_number)
+            return True, wa_id
+
+    def set_wa_id(self, phone_number: str, wa_id: str) -> None:
+        """Store the WhatsApp ID returned by Meta for a phone number.
+
+        Args:
+            phone_number (str): Normalized phone number.
+            wa_id (str): WhatsApp ID.
+        """
+        self._set(phone_number, wa_id)
+
+    def mark_invalid(self, phone_number: str) -> None:
+        """Mark a phone number as not reachable on WhatsApp.
+
+        Args:
+            phone_number (str): Normalized phone number.
+        """
+        self._set(phone_number, None)
+
+    def get(self, phone_number: str) -> str | None:
+        """Get the WhatsApp ID of a phone number.
+
+        Args:
+            phone_number (str): Normalized phone number.
+
+        Returns:
+            str | None: WhatsApp ID, or None if unknown or invalid.
+        """
+        return self.lookup(phone_number)[1]
+
+    def is_invalid(self, phone_number: str) -> bool:
+        """Check if a phone number is known to be invalid.
+
+        Args:
+            phone_number (str): Normalized phone number.
+
+        Returns:
+            bool: True if the phone number was marked as invalid.
+        """
+        found, wa_id = self.lookup(phone_number)
+        return found and wa_id is None
+
+    def resolve(self, phone_number: str) -> tuple[bool, str]:
+        """Resolve a phone number to the recipient to send messages to.
+
+        Webhook statuses are recorded by WhatsApp ID, which may differ from
+        the phone number, so both are checked.
+
+        Args:
+            phone_number (str): Normalized phone number.
+
+        Returns:
+            tuple[bool, str]: Whether the phone number or its WhatsApp ID is
+                known to be invalid, and the cached WhatsApp ID, or the phone
+                number if not cached.
+        """
+        found, wa_id = self.lookup(phone_number)
+        if found and wa_id is None:
+            return True, phone_number
+        if wa_id is None:
+            return False, phone_number
+        return self.is_invalid(wa_id), wa_id
+
+    def record_status(self, status: dict[str, Any]) -> bool:
+        """Record a message status received in a webhook notification.
+
+        Undeliverable messages are usually reported asynchronously, as a
+        failed status, instead of in the send response. This marks the
+        recipient as invalid when the status failed with
+        UNDELIVERABLE_ERROR_CODE.
+
+        https://developers.facebook.com/docs/whatsapp/cloud-api/webhooks/components#statuses-object
+
+        Args:
+            status (dict[str, Any]): Status object of the webhook, with the
+                keys status, recipient_id and errors.
+
+        Returns:
+            bool: True if the recipient was marked as invalid.
+        """
+        if status.get("status") != "failed" or "recipient_id" not in status:
+            return False
+        codes = {error.get("code") for error in status.get("errors", [])}
+        if UNDELIVERABLE_ERROR_CODE not in codes:
+            return False
+        self.mark_invalid(status["recipient_id"])
+        return True
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+def resolve_recipients(
+    phone_numbers: Iterable[str],
+    cache: WaIdCache | None = None,
+    default_country_code: str | None = None,
+    national_number_length: int | None = None,
+) -> tuple[dict[str, str], list[str]]:
+    """Resolve raw phone numbers to the value to send as recipient.
+
+    Invalid phone numbers and the ones marked as invalid in the cache are
+    skipped, so they do not spend a request.
+
+    Args:
+        phone_numbers (Iterable[str]): Raw phone numbers.
+        cache (WaIdCache, optional): Cache of known WhatsApp IDs.
+            Defaults to None.
+        default_country_code (str, optional): See normalize_phone_number.
+            Defaults to None.
+        national_number_length (int, optional): See normalize_phone_number.
+            Defaults to None.
+
+    Returns:
+        tuple[dict[str, str], list[str]]: WhatsApp ID, or normalized phone
+            number if not cached, for every valid input phone number; and the
+            skipped input phone numbers.
+    """
+    recipients = {}
+    skipped = []
+    for phone_number, normalized in normalize_phone_numbers(
+        phone_numbers, default_country_code, national_number_length
+    ).items():
+        if normalized is None:
+            skipped.append(phone_number)
+            continue
+        if cache is None:
+            recipients[phone_number] = normalized
+            continue
+        invalid, recipient = cache.resolve(normalized)
+        if invalid:
+            skipped.append(phone_number)
+        else:
+            recipients[phone_number] = recipient
+    return recipients, skipped
@@ -0,0 +1,61 @@
+"""Module for testing inbound media download."""
+import io
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.whatsappy.client import Client  # noqa
+
+load_dotenv()
+WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
+PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+MEDIA_ID = os.getenv("MEDIA_ID")
+
+if WHATSAPP_TOKEN is None:
+    raise ValueError("WHATSAPP_TOKEN enviroment variable not found")
+
+if PHONE_NUMBER_ID is None:
+    raise ValueError("PHONE_NUMBER_ID enviroment variable not found")
+
+CLIENT = Client(WHATSAPP_TOKEN, int(PHONE_NUMBER_ID))
+
+
+def test_media_url() -> None:
+    """Base case for media url."""
+    if MEDIA_ID is None:
+        raise ValueError("MEDIA_ID enviroment variable not found")
+
+    response = CLIENT.media_url(MEDIA_ID)
+    content = response.json()
+    assert "error" not in content
+    assert "url" in content
+    assert content["id"] == MEDIA_ID
+    assert response.status_code == 200
+
+
+def test_download_media_to_file_object() -> None:
+    """Media downloaded into a file-like object."""
+    if MEDIA_ID is None:
+        raise ValueError("MEDIA_ID enviroment variable not found")
+
+    file_size = CLIENT.media_url(MEDIA_ID).json()["file_size"]
+    buffer = io.BytesIO()
+    written = CLIENT.download_media(MEDIA_ID, buffer, chunk_size=1024)
+    assert written == file_size
+    assert len(buffer.getvalue()) == file_size
+
+
+def test_download_medias_with_repeated_ids(tmp_path: Path) -> None:
+    """Repeated media ids are downloaded once into the cache directory."""
+    if MEDIA_ID is None:
+        raise ValueError("MEDIA_ID enviroment variable not found")
+
+    paths = CLIENT.download_medias([MEDIA_ID, MEDIA_ID], tmp_path)
+    assert list(paths) == [MEDIA_ID]
+    assert paths[MEDIA_ID] == tmp_path / MEDIA_ID
+    assert paths[MEDIA_ID].exists()
+    assert [path.name for path in tmp_path.iterdir()] == [MEDIA_ID]
@@ -0,0 +1,198 @@
+"""Module for testing inbound media download without network access."""
+import io
+import sys
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+import requests
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.whatsappy.client import Client  # noqa
+
+MEDIA_CONTENT = b"0123456789" * 10
+
+
+class FakeResponse:
+    """Fake streaming response for media url and media requests."""
+
+    def __init__(self, url: str, fail: bool = False, content: Any = None) -> None:
+        """Initialize FakeResponse object."""
+        self.url = url
+        self.fail = fail
+        self.content = content
+
+    def __enter__(self) -> "FakeResponse":
+        """Enter context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit context manager."""
+
+    def raise_for_status(self) -> None:
+        """Never raise, every request succeeds."""
+
+    def json(self) -> Any:
+        """Media url json content."""
+        if self.content is not None:
+            return self.content
+        return {"url": f"https://lookaside.example/{self.url.rsplit('/', 1)[1]}"}
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """Yield the media content in chunks, failing midway if asked to."""
+        for start in range(0, len(MEDIA_CONTENT), chunk_size):
+            if self.fail and start > 0:
+                raise requests.ConnectionError("connection reset")
+            yield MEDIA_CONTENT[start : start + chunk_size]
+
+
+class RecordingSession(requests.Session):
+    """Session which records the requests done with it and its closing."""
+
+    def __init__(self) -> None:
+        """Initialize RecordingSession object."""
+        super().__init__()
+        self.urls: list[str] = []
+        self.closed = False
+
+    def close(self) -> None:
+        """Close the session."""
+        self.closed = True
+        super().close()
+
+
+class FakeClient:
+    """Records the requests done by a client with patched _session and _get."""
+
+    def __init__(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        fail: bool = False,
+        content: Any = None,
+    ) -> None:
+        """Initialize FakeClient object."""
+        self.client = Client("token", 1)
+        self.urls: list[str] = []
+        self.sessions: list[RecordingSession] = []
+        self.fail = fail
+        self.content = content
+        monkeypatch.setattr(self.client, "_session", self._session)
+        monkeypatch.setattr(self.client, "_get", self._get)
+
+    def _session(self) -> RecordingSession:
+        session = RecordingSession()
+        self.sessions.append(session)
+        return session
+
+    def _get(
+        self, session: RecordingSession, url: str, stream: bool = False
+    ) -> FakeResponse:
+        self.urls.append(url)
+        session.urls.append(url)
+        return FakeResponse(url, fail=self.fail and stream, content=self.content)
+
+
+class RecordingFile(io.BytesIO):
+    """Binary file which records the size of every write."""
+
+    def __init__(self) -> None:
+        """Initialize RecordingFile object."""
+        super().__init__()
+        self.sizes: list[int] = []
+
+    def write(self, data: Any) -> int:
+        """Record the size of the written data."""
+        self.sizes.append(len(data))
+        return super().write(data)
+
+
+def test_download_media_in_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Media is written in chunk_size pieces."""
+    fake = FakeClient(monkeypatch)
+    file = RecordingFile()
+    written = fake.client.download_media("123", file, chunk_size=30)
+    assert written == len(MEDIA_CONTENT)
+    assert file.getvalue() == MEDIA_CONTENT
+    assert file.sizes == [30, 30, 30, 10]
+
+
+def test_download_media_to_path(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Media is written to the given path."""
+    fake = FakeClient(monkeypatch)
+    fake.client.download_media("123", tmp_path / "media.ogg", chunk_size=16)
+    assert (tmp_path / "media.ogg").read_bytes() == MEDIA_CONTENT
+
+
+def test_download_media_closes_session(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Media url and media are requested with one session, closed after."""
+    fake = FakeClient(monkeypatch)
+    fake.client.download_media("123", io.BytesIO())
+    assert len(fake.sessions) == 1
+    assert len(fake.sessions[0].urls) == 2
+    assert fake.sessions[0].closed
+
+
+def test_download_media_to_path_failed(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A failed download to a path leaves no file behind."""
+    fake = FakeClient(monkeypatch, fail=True)
+    with pytest.raises(requests.ConnectionError):
+        fake.client.download_media("123", tmp_path / "media.ogg", chunk_size=10)
+    assert list(tmp_path.iterdir()) == []
+    assert fake.sessions[0].closed
+
+
+@pytest.mark.parametrize("content", [{"error": {"code": 100}}, ["url"]])
+def test_download_media_without_url(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, content: Any
+) -> None:
+    """A media url response without url raises ValueError."""
+    fake = FakeClient(monkeypatch, content=content)
+    with pytest.raises(ValueError):
+        fake.client.download_media("123", tmp_path / "media.ogg")
+    assert len(fake.urls) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_medias_uses_cache(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Repeated and already cached media ids are not downloaded again."""
+    fake = FakeClient(monkeypatch)
+    paths = fake.client.download_medias(["1", "2", "1"], tmp_path)
+    assert paths == {"1": tmp_path / "1", "2": tmp_path / "2"}
+    assert len(fake.urls) == 4
+    assert (tmp_path / "1").read_bytes() == MEDIA_CONTENT
+
+    paths = fake.client.download_medias(["1", "2"], tmp_path)
+    assert paths == {"1": tmp_path / "1", "2": tmp_path / "2"}
+    assert len(fake.urls) == 4
+    assert len(fake.sessions) == 2
+    assert all(session.closed for session in fake.sessions)
+
+
+def test_download_medias_failed_download(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A failed download leaves no partial file nor cache entry."""
+    fake = FakeClient(monkeypatch, fail=True)
+    with pytest.raises(requests.ConnectionError):
+        fake.client.download_medias(["1"], tmp_path, chunk_size=10)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("media_id", ["", "../x", "/tmp/x", "a/b", ".", ".."])
+def test_download_medias_invalid_media_id(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, media_id: str
+) -> None:
+    """Media ids which are not plain file names are rejected."""
+    fake = FakeClient(monkeypatch)
+    cache = tmp_path / "cache"
+    with pytest.raises(ValueError):
+        fake.client.download_medias(["1", media_id], cache)
+    assert fake.urls == []
+    assert not cache.exists()
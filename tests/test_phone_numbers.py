@@ -0,0 +1,308 @@
+"""Module for testing phone number normalization and wa_id cache."""
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from requests.models import Response
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.whatsappy.client import Client  # noqa
+from src.whatsappy.phone import (  # noqa
+    UNDELIVERABLE_ERROR_CODE,
+    WaIdCache,
+    normalize_phone_number,
+    normalize_phone_numbers,
+    resolve_recipients,
+)
+
+
+def test_normalize_phone_number() -> None:
+    """Formatting characters and international prefixes are removed."""
+    assert normalize_phone_number("+56 9 9999-9999") == "56999999999"
+    assert normalize_phone_number("0056 (9) 9999.9999") == "56999999999"
+    assert normalize_phone_number("56999999999") == "56999999999"
+
+
+def test_normalize_phone_number_with_unicode_separators() -> None:
+    """Unicode whitespace, dashes and brackets are removed."""
+    assert normalize_phone_number("+56\xa09 9999 9999") == "56999999999"
+    assert normalize_phone_number("+56 9 9999\u20119999") == "56999999999"
+    assert normalize_phone_number("\u200956\u3000\uff089\uff09\u20139999 9999") == (
+        "56999999999"
+    )
+
+
+def test_normalize_phone_number_with_other_punctuation() -> None:
+    """Punctuation other than dashes, dots and brackets is invalid."""
+    assert normalize_phone_number("#31#56999999999") is None
+    assert normalize_phone_number("*31#56999999999") is None
+    assert normalize_phone_number("56999,999,999") is None
+    assert normalize_phone_number("56/99999/9999") is None
+    assert normalize_phone_number("+56 9 9999\uff0e9999") is None
+
+
+def test_normalize_phone_number_with_default_country_code() -> None:
+    """Default country code is prepended to national numbers."""
+    assert normalize_phone_number("09 9999 9999", "56") == "56999999999"
+    assert normalize_phone_number("+1 555 555 5555", "56") == "15555555555"
+    assert normalize_phone_number("0056 9 9999 9999", "1") == "56999999999"
+
+
+def test_normalize_ambiguous_phone_number() -> None:
+    """Numbers which may already include the country code are invalid."""
+    assert normalize_phone_number("56999999999", "56") is None
+    assert normalize_phone_number("0 56 999999999", "56") is None
+    assert normalize_phone_number("9123456789", "91") is None
+
+
+def test_normalize_phone_number_with_national_number_length() -> None:
+    """National number length tells apart national and international numbers."""
+    assert normalize_phone_number("9 9999 9999", "56", 9) == "56999999999"
+    assert normalize_phone_number("09 9999 9999", "56", 9) == "56999999999"
+    assert normalize_phone_number("56999999999", "56", 9) == "56999999999"
+    assert normalize_phone_number("56 9999 9999", "56", 9) is None
+    assert normalize_phone_number("0 56 999999999", "56", 9) == "56999999999"
+    assert normalize_phone_number("5656999999999", "56", 9) is None
+    assert normalize_phone_number("9123456789", "91", 10) == "919123456789"
+    assert normalize_phone_number("919123456789", "91", 10) == "919123456789"
+
+
+def test_normalize_invalid_phone_number() -> None:
+    """Invalid phone numbers are normalized to None."""
+    assert normalize_phone_number("") is None
+    assert normalize_phone_number("1234") is None
+    assert normalize_phone_number("1234567890123456") is None
+    assert normalize_phone_number("56+999999999") is None
+    assert normalize_phone_number("0999999999") is None
+    assert normalize_phone_number("abc 56 9 9999 9999 ext 12") is None
+    assert normalize_phone_number("56 9 9999 9999 x") is None
+    assert normalize_phone_number("\u0665\u0666999999999") is None
+
+
+def test_normalize_phone_numbers() -> None:
+    """Repeated inputs appear once, in input order."""
+    normalized = normalize_phone_numbers(["+56999999999", "123", "+56999999999"])
+    assert normalized == {"+56999999999": "56999999999", "123": None}
+
+
+def test_wa_id_cache() -> None:
+    """Cache stores wa_ids and invalid markers."""
+    cache = WaIdCache()
+    cache.set_wa_id("56999999999", "56999999999")
+    cache.mark_invalid("56888888888")
+    assert cache.get("56999999999") == "56999999999"
+    assert not cache.is_invalid("56999999999")
+    assert cache.get("56888888888") is None
+    assert cache.is_invalid("56888888888")
+    assert cache.get("56777777777") is None
+    assert not cache.is_invalid("56777777777")
+
+
+def test_wa_id_cache_evicts_least_recently_used() -> None:
+    """The least recently used entry is evicted when max size is exceeded."""
+    cache = WaIdCache(max_size=2)
+    cache.set_wa_id("1", "a")
+    cache.set_wa_id("2", "b")
+    cache.get("1")
+    cache.set_wa_id("3", "c")
+    assert len(cache) == 2
+    assert cache.get("1") == "a"
+    assert cache.get("2") is None
+    assert cache.get("3") == "c"
+
+
+def test_wa_id_cache_expiration() -> None:
+    """Expired entries are not returned."""
+    cache = WaIdCache(ttl=0.01)
+    cache.mark_invalid("56888888888")
+    time.sleep(0.02)
+    assert not cache.is_invalid("56888888888")
+    assert len(cache) == 0
+
+
+def test_wa_id_cache_lookup() -> None:
+    """Lookup tells apart unknown, valid and invalid phone numbers."""
+    cache = WaIdCache()
+    cache.set_wa_id("56999999999", "56999999990")
+    cache.mark_invalid("56888888888")
+    assert cache.lookup("56999999999") == (True, "56999999990")
+    assert cache.lookup("56888888888") == (True, None)
+    assert cache.lookup("56777777777") == (False, None)
+
+
+def test_wa_id_cache_record_status() -> None:
+    """Failed undeliverable webhook statuses mark the recipient invalid."""
+    cache = WaIdCache()
+    failed = {
+        "id": "wamid.1",
+        "status": "failed",
+        "recipient_id": "56888888888",
+        "errors": [{"code": UNDELIVERABLE_ERROR_CODE, "title": "Undeliverable"}],
+    }
+    assert cache.record_status(failed)
+    assert cache.is_invalid("56888888888")
+
+    other_error = dict(failed, recipient_id="56777777777", errors=[{"code": 1}])
+    delivered = {"id": "wamid.2", "status": "delivered", "recipient_id": "56666"}
+    assert not cache.record_status(other_error)
+    assert not cache.record_status(delivered)
+    assert not cache.is_invalid("56777777777")
+    assert not cache.is_invalid("56666")
+
+
+def test_resolve_recipients() -> None:
+    """Invalid and known invalid numbers are skipped, cached wa_ids used."""
+    cache = WaIdCache()
+    cache.set_wa_id("56999999999", "56999999990")
+    cache.mark_invalid("56888888888")
+    recipients, skipped = resolve_recipients(
+        ["+56 9 9999 9999", "+56 8 8888 8888", "56777777777", "123"], cache
+    )
+    assert recipients == {
+        "+56 9 9999 9999": "56999999990",
+        "56777777777": "56777777777",
+    }
+    assert skipped == ["+56 8 8888 8888", "123"]
+
+
+def test_resolve_recipients_with_invalid_wa_id() -> None:
+    """Numbers whose wa_id failed as undeliverable in a webhook are skipped."""
+    cache = WaIdCache()
+    cache.set_wa_id("56999999999", "56999999990")
+    assert cache.record_status(
+        {
+            "id": "wamid.1",
+            "status": "failed",
+            "recipient_id": "56999999990",
+            "errors": [{"code": UNDELIVERABLE_ERROR_CODE}],
+        }
+    )
+    assert cache.resolve("56999999999") == (True, "56999999990")
+    recipients, skipped = resolve_recipients(["+56 9 9999 9999"], cache)
+    assert recipients == {}
+    assert skipped == ["+56 9 9999 9999"]
+
+
+def test_resolve_recipients_without_cache() -> None:
+    """Without cache only invalid numbers are skipped."""
+    recipients, skipped = resolve_recipients(
+        ["9 9999 9999", "56999999999", "x"], None, "56", 9
+    )
+    assert recipients == {
+        "9 9999 9999": "56999999999",
+        "56999999999": "56999999999",
+    }
+    assert skipped == ["x"]
+
+
+class FakePost:
+    """Replaces Client._post, recording the sent messages."""
+
+    def __init__(self, client: Client, content: Any) -> None:
+        """Initialize FakePost object."""
+        self.client = client
+        self.content = content
+        self.messages: list[dict] = []
+
+    def __call__(self) -> Response:
+        """Return a stub response with the configured content."""
+        self.messages.append(dict(self.client.message))
+        response = Response()
+        response.status_code = 400 if "error" in self.content else 200
+        response._content = json.dumps(self.content).encode()
+        return response
+
+
+def fake_client(
+    monkeypatch: pytest.MonkeyPatch, content: Any, cache: WaIdCache | None
+) -> tuple[Client, FakePost]:
+    """Client with its _post patched to return the given content."""
+    client = Client("token", 1, wa_id_cache=cache)
+    fake_post = FakePost(client, content)
+    monkeypatch.setattr(client, "_post", fake_post)
+    return client, fake_post
+
+
+def sent_content(wa_id: str) -> dict:
+    """Content of a successful send response."""
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": wa_id, "wa_id": wa_id}],
+        "messages": [{"id": "wamid.1"}],
+    }
+
+
+def test_client_without_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Without cache the phone number is sent as given."""
+    client, fake_post = fake_client(monkeypatch, sent_content("56999999999"), None)
+    client.text_message(phone_number="+56 9 9999-9999", body="Test string")
+    client.text_message(phone_number="not a number", body="Test string")
+    assert [message["to"] for message in fake_post.messages] == [
+        "+56 9 9999-9999",
+        "not a number",
+    ]
+
+
+def test_client_stores_wa_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The normalized phone number is sent and the wa_id returned stored."""
+    cache = WaIdCache()
+    client, fake_post = fake_client(monkeypatch, sent_content("56999999990"), cache)
+    client.text_message(phone_number="+56 9 9999-9999", body="Test string")
+    assert fake_post.messages[0]["to"] == "56999999999"
+    assert cache.get("56999999999") == "56999999990"
+
+
+def test_client_sends_cached_wa_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The cached wa_id is sent instead of the phone number."""
+    cache = WaIdCache()
+    cache.set_wa_id("56999999999", "56999999990")
+    client, fake_post = fake_client(monkeypatch, sent_content("56999999990"), cache)
+    client.text_message(phone_number="+56 9 9999 9999", body="Test string")
+    assert fake_post.messages[0]["to"] == "56999999990"
+
+
+def test_client_rejects_invalid_phone_number(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Invalid and known invalid numbers raise without sending a request."""
+    cache = WaIdCache()
+    cache.mark_invalid("56888888888")
+    cache.set_wa_id("56777777777", "56777777770")
+    cache.mark_invalid("56777777770")
+    client, fake_post = fake_client(monkeypatch, sent_content("56888888888"), cache)
+    for phone_number in ["+56 8 8888 8888", "+56 7 7777 7777", "abc"]:
+        with pytest.raises(ValueError):
+            client.text_message(phone_number=phone_number, body="Test string")
+    assert fake_post.messages == []
+
+
+@pytest.mark.parametrize(
+    "content", [["error"], {"error": "Undeliverable"}, {"contacts": "56999999999"}]
+)
+def test_client_with_unexpected_response(
+    monkeypatch: pytest.MonkeyPatch, content: Any
+) -> None:
+    """Unexpected response contents are returned without caching anything."""
+    cache = WaIdCache()
+    client, fake_post = fake_client(monkeypatch, content, cache)
+    response = client.text_message(phone_number="56999999999", body="Test string")
+    assert response.json() == content
+    assert len(cache) == 0
+
+
+def test_client_marks_undeliverable_invalid(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """An undeliverable error in the send response marks the number invalid."""
+    cache = WaIdCache()
+    content = {"error": {"code": UNDELIVERABLE_ERROR_CODE, "message": "Undeliverable"}}
+    client, fake_post = fake_client(monkeypatch, content, cache)
+    client.text_message(phone_number="+56 8 8888 8888", body="Test string")
+    assert cache.is_invalid("56888888888")
+    with pytest.raises(ValueError):
+        client.text_message(phone_number="56888888888", body="Test string")
+    assert len(fake_post.messages) == 1